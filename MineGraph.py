@@ -1,8 +1,28 @@
 import os
+import re
 import sys
-import pandas as pd
+import csv
+import hashlib
+import json
+import shlex
+import signal
 import subprocess
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# Label set on the workflow container, e.g. for `docker ps --filter label=minegraph.workflow`
+CONTAINER_LABEL = "minegraph.workflow"
+# Combined, bgzipped PanSN FASTA written to the output directory by /prepare_and_mash_input.py
+PANSN_FASTA = "panSN_output.fasta.gz"
+# FASTA file names for /prepare_and_mash_input.py, one per line, written to the output directory
+FASTA_MANIFEST = ".fasta_manifest.txt"
+# Files Step 1 writes to the output directory: the PanSN FASTA, the downsampled FASTA for
+# RepeatMasker and params.yaml with the MASH-derived PGGB parameters used by Steps 3 and 4
+STEP1_OUTPUTS = (PANSN_FASTA, "downsampled_panSN_output.fasta", "params.yaml")
+# Hash of the input FASTA files used by the last successful Step 1, relative to the output directory
+MASH_CACHE_KEY = os.path.join("mash_cache", "last_key")
+# PGGB options set by run_partitioned_pggb itself, which params.yaml may not override
+PGGB_RESERVED_OPTIONS = ("-i", "--input-fasta", "-o", "--output-dir", "-t", "--threads")
 
 
 def print_help():
@@ -47,7 +67,435 @@ def print_help():
     """)
 
 
-def run_workflow(data_dir, output_dir, metadata=None, threads=16, tree_pars=10, tree_bs=10, quantile=0.25, top_n=50):
+def start_container(data_mount, output_mount, threads):
+    """
+    Start a detached rakanhaib/opggb container that stays alive for the whole workflow,
+    so each step pays a `docker exec` instead of a full container create/teardown.
+
+    The output directory is mounted on both /data and /output (the paths the in-container
+    scripts expect), and the FASTA directory is mounted read-only on /input. The container
+    is limited to `threads` CPUs, pinned to CPUs this process may run on (so Slurm/cgroup/
+    taskset allocations are respected), with unlimited locked memory and a larger /dev/shm
+    for PGGB. It is started with --rm and labelled minegraph.workflow, so it is removed
+    as soon as it is stopped and stray workflow containers are easy to find.
+
+    Args:
+        data_mount (str): Absolute host path of the FASTA directory.
+        output_mount (str): Absolute host path of the output directory.
+        threads (int): Number of CPUs the workflow may use.
+
+    Returns:
+        str: ID of the running container.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        allowed_cpus = sorted(os.sched_getaffinity(0))[:max(1, threads)]
+        cpu_args = ["--cpus", str(len(allowed_cpus)), "--cpuset-cpus", ",".join(map(str, allowed_cpus))]
+    else:
+        # No affinity information on this platform, so only limit the CPU count
+        cpu_args = ["--cpus", str(max(1, min(threads, os.cpu_count() or threads)))]
+    start_command = [
+        "docker", "run", "-d", "--rm", "--label", CONTAINER_LABEL, *cpu_args,
+        "--ulimit", "memlock=-1:-1", "--shm-size=8g",
+        "-v", f"{data_mount}:/input:ro",
+        "-v", f"{output_mount}:/data",
+        "-v", f"{output_mount}:/output",
+        "rakanhaib/opggb", "sleep", "infinity"
+    ]
+    return subprocess.check_output(start_command, text=True).strip()
+
+
+def exec_in_container(container_id, command):
+    """Build the `docker exec` command line for running a command inside the workflow container."""
+    return ["docker", "exec", container_id] + command
+
+
+def fasta_file_args(container_id, output_dir, fasta_files):
+    """
+    Build the FASTA file arguments for /prepare_and_mash_input.py. Images whose script accepts
+    --manifest get the list through a manifest file in the output directory, which keeps large
+    inputs clear of the argv size limit; older images, including the currently published
+    rakanhaib/opggb, get the file names as arguments.
+
+    Support is read from the option list the script prints for --help.
+    """
+    try:
+        probe = subprocess.run(exec_in_container(container_id, ["python", "/prepare_and_mash_input.py", "--help"]),
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace",
+                               timeout=60)
+    except subprocess.TimeoutExpired:
+        return fasta_files
+    if probe.returncode != 0 or not re.search(r"(?<![\w-])--manifest(?![\w-])", probe.stdout):
+        return fasta_files
+
+    with open(os.path.join(output_dir, FASTA_MANIFEST), "w") as f:
+        f.write("\n".join(fasta_files) + "\n")
+    return ["--manifest", f"/output/{FASTA_MANIFEST}"]
+
+
+def _exit_on_sigterm(signum, frame):
+    """Turn SIGTERM (kill, Slurm scancel, timeouts) into SystemExit so cleanup code runs."""
+    raise SystemExit(128 + signum)
+
+
+def stop_container(container_id):
+    """Force-remove the workflow container."""
+    subprocess.run(["docker", "rm", "-f", container_id], check=False,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class Task:
+    """
+    One workflow step: a command line plus the names of the steps it depends on.
+
+    Args:
+        command (list or callable): Command line to launch with subprocess.Popen, or a
+            callable that runs the step itself, takes the task's log path and raises on failure.
+        deps (list, optional): Names of the tasks that must finish before this one starts.
+        start_message (str, optional): Printed when the task is launched.
+        done_message (str, optional): Printed when the task finishes successfully.
+        quiet (bool): Only write the command's output to its log file, not to the console.
+        on_success (callable, optional): Called with no arguments once the task has succeeded.
+    """
+
+    def __init__(self, command, deps=None, start_message=None, done_message=None, quiet=False, on_success=None):
+        self.command = command
+        self.deps = deps or []
+        self.start_message = start_message
+        self.done_message = done_message
+        self.quiet = quiet
+        self.on_success = on_success
+
+
+def launch(command):
+    """Start a command with its stdout and stderr merged into one line-buffered text pipe."""
+    return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=1, text=True,
+                            errors="replace")
+
+
+def _stream_output(proc, log_path, quiet=False):
+    """Append a launched process's output line by line to its log file and, unless quiet, to stdout."""
+    streamed = False
+    try:
+        with open(log_path, "a") as log:
+            for line in proc.stdout:
+                log.write(line)
+                if not quiet:
+                    sys.stdout.write(line)
+                    sys.stdout.flush()
+        streamed = True
+    finally:
+        proc.stdout.close()
+        # Never leave the child blocked on a pipe nobody reads any more
+        if not streamed:
+            proc.kill()
+        proc.wait()
+    return proc.returncode
+
+
+def run_logged(command, log_path, quiet=False):
+    """
+    Run a command, appending its output to log_path (and to stdout unless quiet).
+
+    Raises:
+        subprocess.CalledProcessError: If the command exits with a non-zero code.
+    """
+    returncode = _stream_output(launch(command), log_path, quiet)
+    if returncode != 0:
+        print(f"[ERROR] Command failed with exit code {returncode}, see {log_path} for its output.")
+        raise subprocess.CalledProcessError(returncode, command)
+
+
+def _run_task(task, log_path, dep_futures):
+    """Wait for the task's dependencies, then launch it and stream its output until it exits."""
+    for future in dep_futures:
+        future.result()
+
+    if task.start_message:
+        print(task.start_message)
+    open(log_path, "w").close()
+    if callable(task.command):
+        task.command(log_path)
+    else:
+        run_logged(task.command, log_path, task.quiet)
+    if task.on_success:
+        task.on_success()
+    if task.done_message:
+        print(task.done_message)
+
+
+def run_tasks(tasks, log_dir):
+    """
+    Run a dependency graph of tasks, launching each one as soon as all of its dependencies
+    have finished so that independent steps overlap.
+
+    Args:
+        tasks (dict): Mapping of task name to Task. Dependencies must be listed before
+            the tasks that need them.
+        log_dir (str): Directory where each command's output is saved as <task name>.log.
+
+    Raises:
+        subprocess.CalledProcessError: If any task exits with a non-zero code.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    futures = {}
+    # One worker per task, so a task blocked on its dependencies never starves them of a thread
+    executor = ThreadPoolExecutor(max_workers=max(1, len(tasks)))
+    try:
+        for name, task in tasks.items():
+            missing = [dep for dep in task.deps if dep not in futures]
+            if missing:
+                raise ValueError(f"Task '{name}' depends on unknown or later task(s): {', '.join(missing)}")
+            futures[name] = executor.submit(_run_task, task, os.path.join(log_dir, f"{name}.log"),
+                                            [futures[dep] for dep in task.deps])
+
+        for future in futures.values():
+            future.result()
+    except BaseException:
+        # Don't wait for running steps here (e.g. on SIGTERM), so the caller can stop the container
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+
+def _fasta_names_from_rows(rows, data_dir):
+    """
+    Collect FASTA file names from metadata rows in a single pass. Blank rows are skipped, and
+    a first row that does not name a file in data_dir is treated as the column header.
+    """
+    fasta_files = []
+    first_row = True
+    for row in rows:
+        values = [value for value in row if value not in (None, "")]
+        if not values:
+            continue
+        if len(values) != 1 or row[0] in (None, ""):
+            print("[ERROR] Metadata file must contain only one column with FASTA file names.")
+            sys.exit(1)
+
+        value = values[0]
+        # calamine returns whole-number cells as floats where openpyxl returns ints
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        name = str(value).strip()
+        if first_row:
+            first_row = False
+            if not os.path.isfile(os.path.join(data_dir, name)):
+                print(f"[INFO] Skipping metadata header row '{name}' (not a file in {data_dir}).")
+                continue
+        fasta_files.append(name)
+    return fasta_files
+
+
+def read_metadata(metadata, data_dir):
+    """
+    Read the list of FASTA file names from a one-column CSV or XLSX metadata file,
+    with or without a header row.
+
+    Args:
+        metadata (str): Path to the CSV or XLSX file.
+        data_dir (str): Directory with the FASTA files, used to tell a header row from a file name.
+
+    Returns:
+        list: FASTA file names.
+    """
+    if metadata.endswith(".csv"):
+        with open(metadata, newline="") as f:
+            return _fasta_names_from_rows(csv.reader(f), data_dir)
+    elif metadata.endswith(".xlsx"):
+        try:
+            # Rust-backed reader, much faster than openpyxl when it is installed
+            from python_calamine import CalamineWorkbook
+        except ImportError:
+            from openpyxl import load_workbook
+            workbook = load_workbook(metadata, read_only=True, data_only=True)
+            try:
+                return _fasta_names_from_rows(workbook.worksheets[0].iter_rows(values_only=True), data_dir)
+            finally:
+                workbook.close()
+        sheet = CalamineWorkbook.from_path(metadata).get_sheet_by_index(0)
+        # iter_rows streams the sheet; older python-calamine releases only offer to_python
+        return _fasta_names_from_rows(sheet.iter_rows() if hasattr(sheet, "iter_rows") else sheet.to_python(),
+                                      data_dir)
+    else:
+        print("[ERROR] Unsupported file format. Please use CSV or XLSX.")
+        sys.exit(1)
+
+
+def read_pggb_params(container_id):
+    """
+    Load params.yaml (written by run_repeatmask.py) inside the workflow container and turn it
+    into PGGB command-line options for the per-chromosome runs.
+
+    params.yaml is expected to be a flat mapping of PGGB option names, without leading dashes,
+    to values, e.g. {"p": 95, "s": 5000} -> ["-p", "95", "-s", "5000"]. Single-letter keys
+    become short options and longer keys become hyphenated long options (n_mappings ->
+    --n-mappings). true values are passed as bare flags and false/null values are dropped.
+    Input, output and thread options are set per partition and may not appear in the file.
+    """
+    params = json.loads(subprocess.check_output(exec_in_container(container_id, [
+        "python", "-c",
+        "import json, yaml; print(json.dumps(yaml.safe_load(open('/output/params.yaml')) or {}))"
+    ]), text=True))
+    if not isinstance(params, dict):
+        print("[ERROR] params.yaml must be a mapping of PGGB option names to values.")
+        sys.exit(1)
+
+    pggb_args = []
+    for key, value in params.items():
+        key = str(key).lstrip("-")
+        option = f"-{key}" if len(key) == 1 else "--" + key.replace("_", "-")
+        if option in PGGB_RESERVED_OPTIONS:
+            print(f"[ERROR] params.yaml must not set the PGGB option {option}, it is set for each partition.")
+            sys.exit(1)
+        if isinstance(value, (dict, list)):
+            print(f"[ERROR] params.yaml value for {key} must be a single value, got {value!r}.")
+            sys.exit(1)
+        if value is True:
+            pggb_args.append(option)
+        elif value is not False and value is not None:
+            pggb_args += [option, str(value)]
+    return pggb_args
+
+
+def split_partitions(container_id, output_dir, threads, log_path):
+    """
+    Split the combined PanSN FASTA into one bgzipped FASTA per chromosome. Sequences are
+    grouped by the contig field of their PanSN name (sample#haplotype#contig).
+    The FASTA is re-indexed every time, since Step 1 may have rewritten it.
+
+    Returns:
+        list: Names of the partitions, each with its FASTA in pggb_partitions/<name>/.
+    """
+    fai_path = os.path.join(output_dir, PANSN_FASTA + ".fai")
+    run_logged(exec_in_container(container_id, ["samtools", "faidx", f"/output/{PANSN_FASTA}"]), log_path)
+
+    partitions = {}
+    with open(fai_path) as fai:
+        for line in fai:
+            sequence_name = line.split("\t", 1)[0]
+            chromosome = re.sub(r"[^A-Za-z0-9_.-]", "_", sequence_name.split("#")[-1])
+            partitions.setdefault(chromosome, []).append(sequence_name)
+
+    for chromosome, sequence_names in partitions.items():
+        partition_dir = os.path.join(output_dir, "pggb_partitions", chromosome)
+        os.makedirs(partition_dir, exist_ok=True)
+        with open(os.path.join(partition_dir, "sequences.txt"), "w") as f:
+            f.write("\n".join(sequence_names) + "\n")
+
+        container_dir = f"/output/pggb_partitions/{chromosome}"
+        partition_fasta = shlex.quote(f"{container_dir}/{chromosome}.fa.gz")
+        extract = shlex.join(["samtools", "faidx", f"/output/{PANSN_FASTA}", "-r", f"{container_dir}/sequences.txt"])
+        run_logged(exec_in_container(container_id, [
+            "sh", "-c",
+            f"{extract} | bgzip -@ {threads} > {partition_fasta} && samtools faidx {partition_fasta}"
+        ]), log_path)
+
+    return list(partitions)
+
+
+def run_partitioned_pggb(container_id, output_dir, threads, n_parallel, log_path):
+    """
+    Run PGGB separately on every chromosome partition, n_parallel partitions at a time, and
+    merge the resulting graphs with `odgi squeeze` into pggb_output/merged.og and merged.gfa.
+    Unlike /run_pggb.py, this writes only the merged graph: no VCF or ODGI drawing.
+
+    Args:
+        container_id (str): ID of the running workflow container.
+        output_dir (str): Directory where results will be saved.
+        threads (int): Total number of threads shared by the concurrent PGGB runs.
+        n_parallel (int): Maximum number of partitions aligned at the same time.
+        log_path (str): Log file for the split and merge commands. Each partition's PGGB
+            output goes to pggb_<partition>.log next to it.
+    """
+    partitions = split_partitions(container_id, output_dir, threads, log_path)
+    n_parallel = max(1, min(n_parallel, len(partitions), threads))
+    inner_threads = max(1, threads // n_parallel)
+    pggb_args = read_pggb_params(container_id)
+    print(f"[INFO] Running PGGB on {len(partitions)} partitions, {n_parallel} at a time "
+          f"with {inner_threads} threads each...")
+
+    def run_partition(chromosome):
+        container_dir = f"/output/pggb_partitions/{chromosome}"
+        partition_log = os.path.join(os.path.dirname(log_path), f"pggb_{chromosome}.log")
+        open(partition_log, "w").close()
+        # pggb names its outputs after a hash of its parameters, so clear graphs left by earlier
+        # runs (removed in the container, since the files may be owned by the container user)
+        run_logged(exec_in_container(container_id, ["rm", "-rf", f"{container_dir}/pggb"]), partition_log, quiet=True)
+        # Concurrent partitions would interleave on the console, so they only write to their logs
+        run_logged(exec_in_container(container_id, [
+            "pggb", "-i", f"{container_dir}/{chromosome}.fa.gz", "-o", f"{container_dir}/pggb",
+            "-t", str(inner_threads)
+        ] + pggb_args), partition_log, quiet=True)
+        print(f"[INFO] PGGB finished for partition {chromosome}.")
+
+    with ThreadPoolExecutor(max_workers=n_parallel) as executor:
+        list(executor.map(run_partition, partitions))
+
+    graphs = []
+    for chromosome in partitions:
+        pggb_dir = os.path.join(output_dir, "pggb_partitions", chromosome, "pggb")
+        og_files = sorted(f for f in os.listdir(pggb_dir) if f.endswith(".og")) if os.path.isdir(pggb_dir) else []
+        if not og_files:
+            print(f"[ERROR] PGGB produced no graph for partition {chromosome} "
+                  f"(e.g. it holds a single sequence), see logs/pggb_{chromosome}.log.")
+            sys.exit(1)
+        final_graphs = [f for f in og_files if f.endswith(".final.og")]
+        graph = final_graphs[0] if final_graphs else og_files[-1]
+        graphs.append(f"/output/pggb_partitions/{chromosome}/pggb/{graph}")
+    with open(os.path.join(output_dir, "pggb_partitions", "graphs.txt"), "w") as f:
+        f.write("\n".join(graphs) + "\n")
+
+    os.makedirs(os.path.join(output_dir, "pggb_output"), exist_ok=True)
+    run_logged(exec_in_container(container_id, [
+        "odgi", "squeeze", "-f", "/output/pggb_partitions/graphs.txt",
+        "-o", "/output/pggb_output/merged.og", "-t", str(threads)
+    ]), log_path)
+    # odgi view writes the GFA to stdout, so redirect it inside the container and keep stderr in the log
+    run_logged(exec_in_container(container_id, [
+        "sh", "-c", "odgi view -i /output/pggb_output/merged.og -g > /output/pggb_output/merged.gfa"
+    ]), log_path)
+
+
+def fasta_cache_key(data_dir, fasta_files):
+    """
+    Hash the sorted (name, size, mtime) of the input FASTA files, so Step 1 results can be
+    reused while the inputs are unchanged.
+    """
+    key = hashlib.sha256()
+    for name in sorted(fasta_files):
+        try:
+            stat = os.stat(os.path.join(data_dir, name))
+        except FileNotFoundError:
+            print(f"[ERROR] FASTA file {name} listed in the metadata was not found in {data_dir}.")
+            sys.exit(1)
+        key.update(f"{name}\t{stat.st_size}\t{int(stat.st_mtime)}\n".encode())
+    return key.hexdigest()
+
+
+def prepared_inputs_cached(output_dir, cache_key):
+    """
+    Check whether the outputs in output_dir come from a Step 1 run on the inputs hashed as
+    cache_key: the key of the last successful Step 1 must match, and all of STEP1_OUTPUTS
+    (including the MASH-derived params.yaml) must still exist.
+    """
+    try:
+        with open(os.path.join(output_dir, MASH_CACHE_KEY)) as f:
+            last_key = f.read().strip()
+    except FileNotFoundError:
+        return False
+    return last_key == cache_key and all(os.path.exists(os.path.join(output_dir, name)) for name in STEP1_OUTPUTS)
+
+
+def _write_cache_key(output_dir, cache_key):
+    """Record cache_key as the inputs of the last successful Step 1."""
+    path = os.path.join(output_dir, MASH_CACHE_KEY)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(cache_key + "\n")
+
+
+def run_workflow(data_dir, output_dir, metadata=None, threads=16, tree_pars=10, tree_bs=10, quantile=0.25, top_n=50,
+                 partition=False, partition_jobs=4):
     """
     Run the full workflow with Docker, starting from the given directory.
     Accepts either a file list or all files in data_dir if no file is provided.
@@ -64,6 +512,8 @@ def run_workflow(data_dir, output_dir, metadata=None, threads=16, tree_pars=10,
         :param quantile:
         :param tree_bs: an argument used to be passed for Raxmel bootstraps --bs-trees
         :param tree_pars: an argument used to be passed for Raxmel parsimonious trees --tree
+        :param partition: run PGGB separately per chromosome and merge the graphs with odgi squeeze
+        :param partition_jobs: number of chromosome partitions aligned concurrently when partitioning
     """
     
     os.makedirs(output_dir, exist_ok=True)
@@ -71,78 +521,97 @@ def run_workflow(data_dir, output_dir, metadata=None, threads=16, tree_pars=10,
 
     # Determine selected files based on metadata or process all files in data_dir
     if metadata:
-        if metadata.endswith(".csv"):
-            fasta_files_df = pd.read_csv(metadata)
-        elif metadata.endswith(".xlsx"):
-            fasta_files_df = pd.read_excel(metadata)
-        else:
-            print("[ERROR] Unsupported file format. Please use CSV or XLSX.")
-            sys.exit(1)
-
-        if fasta_files_df.shape[1] != 1:
-            print("[ERROR] Metadata file must contain only one column with FASTA file names.")
-            sys.exit(1)
-
-        fasta_files = fasta_files_df.iloc[:, 0].tolist()
+        fasta_files = read_metadata(metadata, data_dir)
         print(f"[INFO] Processing {len(fasta_files)} FASTA files from {metadata}")
     else:
-        fasta_files = [f for f in os.listdir(data_dir) if f.endswith(".fasta")]
+        with os.scandir(data_dir) as entries:
+            fasta_files = [entry.name for entry in entries
+                           if entry.name.endswith(".fasta") and entry.is_file()]
         print(f"[INFO] Processing all FASTA files in {data_dir}.")
 
-    # Step 1: Prepare FASTA input
-    prepare_command = [
-                          "docker", "run", "--rm", "-v", f"{os.path.abspath(data_dir)}:/data",
-                          "-v", f"{os.path.abspath(output_dir)}:/output",
-                          "rakanhaib/opggb", "python", "/prepare_and_mash_input.py", "/data"
-                      ] + fasta_files
-    subprocess.run(prepare_command, check=True)
-
-    # Step 2: Run RepeatMasker on the downsampled FASTA file
-    print("[STEP 2/5] Running RepeatMasker on downsampled FASTA...")
-    repeatmask_command = [
-    "docker", "run", "--rm", "-v", f"{os.path.abspath(output_dir)}:/data",
-    "pegi3s/repeat_masker", "bash", "-c",
-    f"RepeatMasker /data/downsampled_panSN_output.fasta -pa {threads} -no_is -s"]
-    subprocess.run(repeatmask_command, check=True,stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    print("[INFO] RepeatMasker analysis completed.")
-
-    # Step 3: Run run_repeatmask.py inside Docker to extract the longest TR and update params.yaml
-    print("[STEP 3/5] Extracting longest tandem repeat and updating parameters...")
-    extract_command = [
-        "docker", "run", "--rm", "-v", f"{os.path.abspath(output_dir)}:/data",
-        "rakanhaib/opggb", "python", "/run_repeatmask.py"
-    ]
-    subprocess.run(extract_command, check=True)
-    print("[INFO] Longest tandem repeat extraction completed and params.yaml updated.")
-
-    # Step 4: Run run_pggb.py inside Docker using the specified number of threads
-    print(f"[STEP 4/5] Running PGGB with {threads} threads...")
-    pggb_command = [
-        "docker", "run", "--rm", "-v", f"{os.path.abspath(output_dir)}:/output",
-        "rakanhaib/opggb", "python", "/run_pggb.py", str(threads)
-    ]
-    subprocess.run(pggb_command, check=True)
-    print("[INFO] PGGB alignment and graph generation completed.")
-    
-    
-    # Step 5: Run run_stats.py inside Docker for statistical analysis
-    print("[STEP 5/5] Performing statistical analysis on generated graph and alignments...")
-    stats_command = [
-        "docker", "run", "--rm",
-        "-v", f"{os.path.abspath(output_dir)}:/data",
-        "rakanhaib/opggb",
-        "python", "/run_stats.py",
-        "--threads", "{}".format(threads),
-        "--tree_pars", "{}".format(tree_pars),
-        "--tree_bs", "{}".format(tree_bs),
-        "--input_dir", "/data/pggb_output",
-        "--output_dir", "/data/MineGraph_output",
-        "--quantile", "{}".format(quantile),
-        "--top_n", "{}".format(top_n)
+    # Step 1 is skipped when the last run that prepared output_dir used exactly these FASTA files
+    cache_key = fasta_cache_key(data_dir, fasta_files)
+    step1_cached = prepared_inputs_cached(output_dir, cache_key)
+    if not step1_cached and os.path.exists(os.path.join(output_dir, MASH_CACHE_KEY)):
+        # Step 1 is about to overwrite the prepared outputs, so they no longer match any key
+        os.remove(os.path.join(output_dir, MASH_CACHE_KEY))
 
-    ]
-    subprocess.run(stats_command, check=True)
-    print("[INFO] Statistical analysis completed.")
+    data_mount = os.path.abspath(data_dir)
+    output_mount = os.path.abspath(output_dir)
+
+    def opggb(*command):
+        return exec_in_container(container_id, list(command))
+
+    # Make sure the container is removed even when the workflow is killed with SIGTERM
+    previous_sigterm_handler = signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    container_id = None
+    try:
+        # Start one long-lived MineGraph container and run every opggb step in it as a task graph
+        container_id = start_container(data_mount, output_mount, threads)
+
+        # Step 1: Prepare FASTA input
+        if step1_cached:
+            prepare_task = Task(
+                lambda log_path: None,
+                start_message="[STEP 1/5] Input FASTA files unchanged, reusing prepared FASTA and MASH results...")
+        else:
+            prepare_task = Task(
+                opggb("python", "/prepare_and_mash_input.py", "/input",
+                      *fasta_file_args(container_id, output_dir, fasta_files)),
+                start_message="[STEP 1/5] Preparing FASTA input and computing MASH distances...",
+                done_message="[INFO] FASTA preparation completed.",
+                on_success=lambda: _write_cache_key(output_dir, cache_key))
+
+        tasks = {
+            "prepare": prepare_task,
+
+            # Step 2: Run RepeatMasker on the downsampled FASTA file
+            "repeatmask": Task(
+                ["docker", "run", "--rm", "-v", f"{output_mount}:/data",
+                 "pegi3s/repeat_masker", "RepeatMasker", "/data/downsampled_panSN_output.fasta",
+                 "-pa", str(threads), "-no_is", "-s"],
+                deps=["prepare"],
+                start_message="[STEP 2/5] Running RepeatMasker on downsampled FASTA...",
+                done_message="[INFO] RepeatMasker analysis completed.",
+                quiet=True),
+
+            # Step 3: Run run_repeatmask.py to extract the longest TR and update params.yaml
+            "extract": Task(
+                opggb("python", "/run_repeatmask.py"),
+                deps=["repeatmask"],
+                start_message="[STEP 3/5] Extracting longest tandem repeat and updating parameters...",
+                done_message="[INFO] Longest tandem repeat extraction completed and params.yaml updated."),
+
+            # Step 4: Run run_pggb.py using the specified number of threads, or PGGB per chromosome
+            "pggb": Task(
+                (lambda log_path: run_partitioned_pggb(container_id, output_dir, threads, partition_jobs, log_path))
+                if partition
+                else opggb("python", "/run_pggb.py", str(threads)),
+                deps=["extract"],
+                start_message=f"[STEP 4/5] Running PGGB with {threads} threads...",
+                done_message="[INFO] PGGB alignment and graph generation completed."),
+
+            # Step 5: Run run_stats.py for statistical analysis
+            "stats": Task(
+                opggb(
+                    "python", "/run_stats.py",
+                    "--threads", str(threads),
+                    "--tree_pars", str(tree_pars),
+                    "--tree_bs", str(tree_bs),
+                    "--input_dir", "/output/pggb_output",
+                    "--output_dir", "/output/MineGraph_output",
+                    "--quantile", str(quantile),
+                    "--top_n", str(top_n)
+                ),
+                deps=["pggb"],
+                start_message="[STEP 5/5] Performing statistical analysis on generated graph and alignments...",
+                done_message="[INFO] Statistical analysis completed."),
+        }
+        run_tasks(tasks, os.path.join(output_dir, "logs"))
+    finally:
+        if container_id:
+            stop_container(container_id)
+        signal.signal(signal.SIGTERM, previous_sigterm_handler)
 
     print("\n🎉 [WORKFLOW COMPLETE] All steps finished successfully. Results are in the specified output directory. 🎉")
 
@@ -158,6 +627,12 @@ if __name__ == "__main__":
     parser.add_argument("--quantile", type=int, default=50, help="Consensus nodes percentage of presence,"
                                                                  " 100 means the nodes appeared in 100% of the paths, default is 50")
     parser.add_argument("--top_n", type=int, default="1000", help="top N nodes sizes to be visualized, default is 1000")
+    parser.add_argument("--partition", action="store_true", help="Run PGGB separately per chromosome and merge "
+                                                                 "the graphs with odgi squeeze; only the merged "
+                                                                 "graph (merged.og/merged.gfa) is written to "
+                                                                 "pggb_output, without a VCF or ODGI drawing")
+    parser.add_argument("--partition_jobs", type=int, default=4, help="Number of chromosome partitions aligned "
+                                                                      "concurrently with --partition (default: 4)")
 
     args = parser.parse_args()
 
@@ -169,5 +644,7 @@ if __name__ == "__main__":
         tree_pars=args.tree_pars,
         tree_bs=args.tree_bs,
         quantile=args.quantile/100,
-        top_n=args.top_n
+        top_n=args.top_n,
+        partition=args.partition,
+        partition_jobs=args.partition_jobs
     )